@@ -1,8 +1,66 @@
 import os
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from flask import Flask, render_template, redirect, url_for, flash, request
+from flask.json.provider import DefaultJSONProvider
+from flask.logging import default_handler
 from flask_login import LoginManager, login_required, current_user
 from config import config
-from database import init_db, check_database
+from database import init_db, check_database, ensure_indexes
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to Flask's stdlib json provider
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson, keeping Flask's fallback for other types"""
+
+    def _dumpb(self, obj):
+        # Route datetimes through default() so they format exactly as with the stdlib provider
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        # orjson has no equivalent for json.dumps arguments (separators, sort_keys, ...)
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumpb(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        # The session serializer decodes with object_hook, which orjson doesn't support
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Encode directly; DefaultJSONProvider.response would pass indent/separators to dumps()
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumpb(obj), mimetype=self.mimetype)
+
+def configure_logging(app):
+    """Move app log handlers behind a queue so log I/O runs off the request threads
+
+    Flask's default handler stays in place: it writes to the request's
+    wsgi.errors stream, which is only available on the request thread.
+    """
+    if any(isinstance(h, QueueHandler) for h in app.logger.handlers):
+        return
+    handlers = [h for h in app.logger.handlers if h is not default_handler]
+    if not handlers:
+        return
+
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        app.logger.removeHandler(handler)
+    app.logger.addHandler(QueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
 
 def create_app(config_name='development'):
     """Application factory pattern"""
@@ -11,6 +69,10 @@ def create_app(config_name='development'):
     # Load configuration
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
+    configure_logging(app)
+
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
 
     # Initialize Flask-Login
     login_manager = LoginManager()
@@ -100,6 +162,7 @@ def initialize_database():
         print("Database initialized with test data!")
     else:
         print("Database found. Checking structure...")
+        ensure_indexes(database_path)
         check_database(database_path)
 
 if __name__ == '__main__':
@@ -112,6 +175,10 @@ if __name__ == '__main__':
     # Create app
     app = create_app(config_name)
 
+    # Report which JPEG codec Pillow was built with (libjpeg-turbo has SIMD paths)
+    from PIL import features
+    jpeg_library = 'libjpeg-turbo' if features.check_feature('libjpeg_turbo') else 'libjpeg (slow, no SIMD)'
+
     # Get host and port from environment or use defaults
     host = os.environ.get('HOST', '0.0.0.0')  # Listen on all interfaces
     port = int(os.environ.get('PORT', 5000))
@@ -123,6 +190,7 @@ if __name__ == '__main__':
     🌐 Server: http://{host}:{port}
     📁 Database: {app.config['DATABASE_PATH']}
     📂 Uploads: {app.config['UPLOAD_FOLDER']}
+    🖼️  JPEG codec: {jpeg_library} {features.version('jpg') or ''}
 
     🔑 Test Login: test@example.com / testpass123
     """)
@@ -13,7 +13,12 @@ class Config:
     # File upload configuration
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
+
+    # Uploaded file serving
+    UPLOAD_CACHE_MAX_AGE = 31536000  # Upload filenames are random and never reused
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')  # Apache/lighttpd
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')  # nginx internal location, e.g. /protected-uploads
 
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)  # Remember me for 7 days
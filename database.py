@@ -1,20 +1,48 @@
 import sqlite3
 import os
+from pathlib import Path
 from datetime import datetime
 
-def get_db_connection(database_path='inventory.db'):
-    """Get database connection with proper configuration"""
-    conn = sqlite3.connect(database_path)
+def get_db_connection(database_path='inventory.db', readonly=False):
+    """Get database connection with proper configuration
+
+    Read-only connections take only shared locks and reject writes.
+    """
+    if readonly:
+        conn = sqlite3.connect(f'{Path(database_path).resolve().as_uri()}?mode=ro', uri=True)
+    else:
+        conn = sqlite3.connect(database_path)
     conn.row_factory = sqlite3.Row  # Enable column access by name
 
     # Enable foreign key constraints
     conn.execute('PRAGMA foreign_keys = ON')
 
-    # Set WAL mode for better concurrency
-    conn.execute('PRAGMA journal_mode = WAL')
+    if not readonly:
+        # Set WAL mode for better concurrency
+        conn.execute('PRAGMA journal_mode = WAL')
+
+        # WAL stays consistent with NORMAL sync; only the last commits may be lost on power failure
+        conn.execute('PRAGMA synchronous = NORMAL')
+
+    # Keep hot pages in memory and read the file through mmap
+    conn.execute('PRAGMA cache_size = -64000')  # 64MB
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA mmap_size = 268435456')  # 256MB
 
     return conn
 
+def borrow_connection(database_path='inventory.db', conn=None):
+    """Return (connection, owned): the caller's connection if given, else a new one to close
+
+    conn may also be a zero-argument callable returning a connection, so callers
+    can defer opening one until a query actually runs (e.g. on a cache miss).
+    """
+    if conn is not None and not isinstance(conn, sqlite3.Connection):
+        conn = conn()
+    if conn is not None:
+        return conn, False
+    return get_db_connection(database_path), True
+
 def init_db(database_path='inventory.db'):
     """Initialize the database with all required tables"""
 
@@ -76,10 +104,9 @@ def init_db(database_path='inventory.db'):
         ''')
 
         # Create indexes for better performance
-        conn.execute('CREATE INDEX idx_products_user_id ON products(user_id)')
+        # (users.email and product_pricing.product_id are already indexed by their UNIQUE constraints)
+        conn.execute('CREATE INDEX idx_products_user_updated ON products(user_id, updated_at)')
         conn.execute('CREATE INDEX idx_product_images_product_id ON product_images(product_id)')
-        conn.execute('CREATE INDEX idx_product_pricing_product_id ON product_pricing(product_id)')
-        conn.execute('CREATE INDEX idx_users_email ON users(email)')
 
         conn.commit()
         print("Database initialized successfully!")
@@ -92,6 +119,30 @@ def init_db(database_path='inventory.db'):
     finally:
         conn.close()
 
+def ensure_indexes(database_path='inventory.db'):
+    """Add indexes introduced after the database was first initialized"""
+    conn = get_db_connection(database_path)
+
+    try:
+        # Serves the dashboard's per-user ORDER BY updated_at DESC pagination
+        # (SQLite walks the index backwards, so no DESC column is needed)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_products_user_updated ON products(user_id, updated_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_product_images_product_id ON product_images(product_id)')
+
+        # Redundant indexes only add write cost: the first is a prefix of
+        # idx_products_user_updated, the others duplicate UNIQUE autoindexes
+        conn.execute('DROP INDEX IF EXISTS idx_products_user_id')
+        conn.execute('DROP INDEX IF EXISTS idx_product_pricing_product_id')
+        conn.execute('DROP INDEX IF EXISTS idx_users_email')
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error creating indexes: {e}")
+        raise
+    finally:
+        conn.close()
+
 def create_test_data(database_path='inventory.db'):
     """Create some test data for development"""
     from werkzeug.security import generate_password_hash
@@ -147,7 +198,7 @@ def check_database(database_path='inventory.db'):
         print(f"Database {database_path} does not exist!")
         return
 
-    conn = get_db_connection(database_path)
+    conn = get_db_connection(database_path, readonly=True)
 
     try:
         # Check tables
@@ -1,6 +1,63 @@
-from database import get_db_connection
+from database import borrow_connection
 from datetime import datetime
 import os
+import threading
+import time
+
+# Short-lived per-process cache of per-user query results, dropped on writes
+CACHE_TTL = 30  # seconds
+CACHE_MAX_ENTRIES = 1024
+_cache = {}
+_cache_lock = threading.Lock()
+_MISSING = object()
+
+def _cache_get(key):
+    """Return a cached value, or _MISSING if absent or expired"""
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return _MISSING
+        return entry[1]
+
+def _cache_set(key, value):
+    """Cache a value for CACHE_TTL seconds"""
+    now = time.monotonic()
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            for stale_key in [k for k, (expires, _) in _cache.items() if expires < now]:
+                del _cache[stale_key]
+            if len(_cache) >= CACHE_MAX_ENTRIES:
+                _cache.clear()
+        _cache[key] = (now + CACHE_TTL, value)
+
+def invalidate_user_cache(user_id, database_path='inventory.db'):
+    """Drop cached results for a user after their products change"""
+    with _cache_lock:
+        for key in [k for k in _cache if k[:2] == (database_path, user_id)]:
+            del _cache[key]
+
+# Pricing fields as returned by get_pricing, get_full and to_dict_batch
+_PRICING_COLUMNS = ('buying_price', 'selling_price', 'mrp', 'updated_at')
+
+def _fetch_images(conn, product_ids):
+    """Return {product_id: [image dicts]} for the given products, oldest upload first"""
+    images_by_product = {product_id: [] for product_id in product_ids}
+
+    # Stay well below SQLite's bound-parameter limit
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+
+        for row in conn.execute(f'''
+            SELECT product_id, id, filename, original_name, upload_date
+            FROM product_images
+            WHERE product_id IN ({placeholders})
+            ORDER BY upload_date ASC, id ASC
+        ''', chunk):
+            image = dict(row)
+            images_by_product[image.pop('product_id')].append(image)
+
+    return images_by_product
 
 class Product:
     """Product model for inventory management"""
@@ -15,9 +72,9 @@ class Product:
         self.updated_at = updated_at
 
     @staticmethod
-    def create_product(user_id, name, description='', quantity=0, database_path='inventory.db'):
+    def create_product(user_id, name, description='', quantity=0, database_path='inventory.db', conn=None):
         """Create a new product"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
             cursor = conn.execute('''
                 INSERT INTO products (user_id, name, description, quantity)
@@ -26,19 +83,21 @@ class Product:
 
             product_id = cursor.lastrowid
             conn.commit()
+            invalidate_user_cache(user_id, database_path)
 
-            return Product.get_by_id(product_id, database_path)
+            return Product.get_by_id(product_id, database_path, conn)
 
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
     @staticmethod
-    def get_by_id(product_id, database_path='inventory.db'):
+    def get_by_id(product_id, database_path='inventory.db', conn=None):
         """Get product by ID"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
             product_data = conn.execute('''
                 SELECT id, user_id, name, description, quantity, created_at, updated_at
@@ -59,12 +118,56 @@ class Product:
             return None
 
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
     @staticmethod
-    def get_by_user(user_id, limit=None, offset=0, search_term='', database_path='inventory.db'):
-        """Get products by user ID with optional pagination and search"""
-        conn = get_db_connection(database_path)
+    def get_full(product_id, database_path='inventory.db', conn=None):
+        """Get product with pricing and images as a dictionary (see to_dict)"""
+        conn, owns_conn = borrow_connection(database_path, conn)
+        try:
+            pricing_columns = ', '.join(f'pr.{column} AS pricing_{column}' for column in _PRICING_COLUMNS)
+            row = conn.execute(f'''
+                SELECT p.id, p.user_id, p.name, p.description, p.quantity, p.created_at, p.updated_at,
+                       pr.product_id AS pricing_product_id, {pricing_columns}
+                FROM products p
+                LEFT JOIN product_pricing pr ON pr.product_id = p.id
+                WHERE p.id = ?
+            ''', (product_id,)).fetchone()
+
+            if not row:
+                return None
+
+            product = Product(
+                id=row['id'],
+                user_id=row['user_id'],
+                name=row['name'],
+                description=row['description'],
+                quantity=row['quantity'],
+                created_at=row['created_at'],
+                updated_at=row['updated_at']
+            )
+
+            product_dict = product.to_dict(include_pricing=False, include_images=False)
+            product_dict['pricing'] = None
+            if row['pricing_product_id'] is not None:
+                product_dict['pricing'] = {column: row[f'pricing_{column}'] for column in _PRICING_COLUMNS}
+            product_dict['images'] = product.get_images(database_path, conn)
+
+            return product_dict
+
+        finally:
+            if owns_conn:
+                conn.close()
+
+    @staticmethod
+    def get_by_user(user_id, limit=None, offset=0, search_term='', after_id=None, database_path='inventory.db', conn=None):
+        """Get products by user ID with optional pagination and search
+
+        When after_id is given, rows continue after that product (keyset
+        pagination) and offset is ignored.
+        """
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
             query = '''
                 SELECT id, user_id, name, description, quantity, created_at, updated_at
@@ -79,11 +182,19 @@ class Product:
                 search_pattern = f'%{search_term}%'
                 params.extend([search_pattern, search_pattern])
 
-            # Add ordering
-            query += ' ORDER BY updated_at DESC'
+            # Continue after a known product instead of skipping rows
+            if after_id:
+                query += ' AND (updated_at, id) < (SELECT updated_at, id FROM products WHERE id = ?)'
+                params.append(after_id)
+
+            # Add ordering (id breaks ties so keyset pages never overlap)
+            query += ' ORDER BY updated_at DESC, id DESC'
 
             # Add pagination
-            if limit:
+            if limit and after_id:
+                query += ' LIMIT ?'
+                params.append(limit)
+            elif limit:
                 query += ' LIMIT ? OFFSET ?'
                 params.extend([limit, offset])
 
@@ -102,11 +213,12 @@ class Product:
             return products
 
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
-    def update(self, name=None, description=None, quantity=None, database_path='inventory.db'):
+    def update(self, name=None, description=None, quantity=None, database_path='inventory.db', conn=None):
         """Update product details"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
             if name is not None:
                 self.name = name
@@ -122,35 +234,39 @@ class Product:
             ''', (self.name, self.description, self.quantity, self.id))
 
             conn.commit()
+            invalidate_user_cache(self.user_id, database_path)
             return True
 
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
-    def delete(self, database_path='inventory.db'):
+    def delete(self, database_path='inventory.db', conn=None):
         """Delete product and associated data"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
             # Delete product (cascade will handle images and pricing)
             conn.execute('DELETE FROM products WHERE id = ?', (self.id,))
             conn.commit()
+            invalidate_user_cache(self.user_id, database_path)
             return True
 
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
-    def get_pricing(self, database_path='inventory.db'):
+    def get_pricing(self, database_path='inventory.db', conn=None):
         """Get pricing information for this product"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
-            pricing_data = conn.execute('''
-                SELECT buying_price, selling_price, mrp, updated_at
+            pricing_data = conn.execute(f'''
+                SELECT {', '.join(_PRICING_COLUMNS)}
                 FROM product_pricing
                 WHERE product_id = ?
             ''', (self.id,)).fetchone()
@@ -158,59 +274,48 @@ class Product:
             return dict(pricing_data) if pricing_data else None
 
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
-    def set_pricing(self, buying_price=None, selling_price=None, mrp=None, database_path='inventory.db'):
+    def set_pricing(self, buying_price=None, selling_price=None, mrp=None, database_path='inventory.db', conn=None):
         """Set or update pricing for this product"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
-            # Check if pricing exists
-            existing = conn.execute('''
-                SELECT COUNT(*) as count FROM product_pricing WHERE product_id = ?
-            ''', (self.id,)).fetchone()
-
-            if existing['count'] > 0:
-                # Update existing pricing
-                conn.execute('''
-                    UPDATE product_pricing
-                    SET buying_price = ?, selling_price = ?, mrp = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE product_id = ?
-                ''', (buying_price, selling_price, mrp, self.id))
-            else:
-                # Insert new pricing
-                conn.execute('''
-                    INSERT INTO product_pricing (product_id, buying_price, selling_price, mrp)
-                    VALUES (?, ?, ?, ?)
-                ''', (self.id, buying_price, selling_price, mrp))
+            # Insert new pricing, or update the existing row (product_id is UNIQUE)
+            conn.execute('''
+                INSERT INTO product_pricing (product_id, buying_price, selling_price, mrp)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (product_id) DO UPDATE
+                SET buying_price = excluded.buying_price,
+                    selling_price = excluded.selling_price,
+                    mrp = excluded.mrp,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (self.id, buying_price, selling_price, mrp))
 
             conn.commit()
+            invalidate_user_cache(self.user_id, database_path)
             return True
 
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
-    def get_images(self, database_path='inventory.db'):
+    def get_images(self, database_path='inventory.db', conn=None):
         """Get all images for this product"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
-            images = conn.execute('''
-                SELECT id, filename, original_name, upload_date
-                FROM product_images
-                WHERE product_id = ?
-                ORDER BY upload_date ASC
-            ''', (self.id,)).fetchall()
-
-            return [dict(img) for img in images]
+            return _fetch_images(conn, [self.id])[self.id]
 
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
-    def add_image(self, filename, original_name, database_path='inventory.db'):
+    def add_image(self, filename, original_name, database_path='inventory.db', conn=None):
         """Add an image to this product"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
             cursor = conn.execute('''
                 INSERT INTO product_images (product_id, filename, original_name)
@@ -219,17 +324,44 @@ class Product:
 
             image_id = cursor.lastrowid
             conn.commit()
+            invalidate_user_cache(self.user_id, database_path)
             return image_id
 
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
+
+    def add_images(self, images, database_path='inventory.db', conn=None):
+        """Add several (filename, original_name) images in one transaction"""
+        conn, owns_conn = borrow_connection(database_path, conn)
+        try:
+            conn.executemany('''
+                INSERT INTO product_images (product_id, filename, original_name)
+                VALUES (?, ?, ?)
+            ''', [(self.id, filename, original_name) for filename, original_name in images])
+
+            conn.commit()
+            invalidate_user_cache(self.user_id, database_path)
+            return True
+
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            if owns_conn:
+                conn.close()
+
+    @staticmethod
+    def thumbnail_filename(filename):
+        """Name of the listing-size copy stored next to an uploaded image"""
+        return f'thumb_{filename}'
 
-    def remove_image(self, image_id, upload_folder, database_path='inventory.db'):
+    def remove_image(self, image_id, upload_folder, database_path='inventory.db', conn=None):
         """Remove an image from this product"""
-        conn = get_db_connection(database_path)
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
             # Get image info before deleting
             image_data = conn.execute('''
@@ -244,12 +376,15 @@ class Product:
                     WHERE id = ? AND product_id = ?
                 ''', (image_id, self.id))
 
-                # Delete physical file
-                file_path = os.path.join(upload_folder, 'products', f'user_{self.user_id}', image_data['filename'])
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                # Delete physical files
+                user_dir = os.path.join(upload_folder, 'products', f'user_{self.user_id}')
+                for filename in (image_data['filename'], Product.thumbnail_filename(image_data['filename'])):
+                    file_path = os.path.join(user_dir, filename)
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
 
                 conn.commit()
+                invalidate_user_cache(self.user_id, database_path)
                 return True
 
             return False
@@ -258,9 +393,10 @@ class Product:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
-    def to_dict(self, include_pricing=True, include_images=True, database_path='inventory.db'):
+    def to_dict(self, include_pricing=True, include_images=True, database_path='inventory.db', conn=None):
         """Convert product to dictionary"""
         product_dict = {
             'id': self.id,
@@ -273,28 +409,116 @@ class Product:
         }
 
         if include_pricing:
-            product_dict['pricing'] = self.get_pricing(database_path)
+            product_dict['pricing'] = self.get_pricing(database_path, conn)
 
         if include_images:
-            product_dict['images'] = self.get_images(database_path)
+            product_dict['images'] = self.get_images(database_path, conn)
 
         return product_dict
 
     @staticmethod
-    def get_user_product_count(user_id, database_path='inventory.db'):
-        """Get total number of products for a user"""
-        conn = get_db_connection(database_path)
+    def to_dict_batch(products, database_path='inventory.db', conn=None):
+        """Convert several products to dictionaries, fetching pricing and images in bulk"""
+        if not products:
+            return []
+
+        product_ids = [product.id for product in products]
+        pricing_by_product = {}
+
+        conn, owns_conn = borrow_connection(database_path, conn)
+        try:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+
+                for row in conn.execute(f'''
+                    SELECT product_id, {', '.join(_PRICING_COLUMNS)}
+                    FROM product_pricing
+                    WHERE product_id IN ({placeholders})
+                ''', chunk):
+                    pricing = dict(row)
+                    pricing_by_product[pricing.pop('product_id')] = pricing
+
+            images_by_product = _fetch_images(conn, product_ids)
+
+        finally:
+            if owns_conn:
+                conn.close()
+
+        product_dicts = []
+        for product in products:
+            product_dict = product.to_dict(include_pricing=False, include_images=False)
+            product_dict['pricing'] = pricing_by_product.get(product.id)
+            product_dict['images'] = images_by_product[product.id]
+            product_dicts.append(product_dict)
+
+        return product_dicts
+
+    @staticmethod
+    def search(user_id, query, limit=10, database_path='inventory.db', conn=None):
+        """Search a user's products, returning id, name, selling_price and first image per hit
+
+        Results are cached briefly per query.
+        """
+        cache_key = (database_path, user_id, 'search', query, limit)
+        results = _cache_get(cache_key)
+        if results is not _MISSING:
+            return results
+
+        conn, owns_conn = borrow_connection(database_path, conn)
+        try:
+            search_pattern = f'%{query}%'
+            rows = conn.execute('''
+                SELECT p.id, p.name, pr.selling_price,
+                       (SELECT filename FROM product_images
+                        WHERE product_id = p.id
+                        ORDER BY upload_date ASC, id ASC
+                        LIMIT 1) AS image
+                FROM products p
+                LEFT JOIN product_pricing pr ON pr.product_id = p.id
+                WHERE p.user_id = ? AND (p.name LIKE ? OR p.description LIKE ?)
+                ORDER BY p.updated_at DESC, p.id DESC
+                LIMIT ?
+            ''', (user_id, search_pattern, search_pattern, limit or -1)).fetchall()
+
+            results = [dict(row) for row in rows]
+            _cache_set(cache_key, results)
+            return results
+
+        finally:
+            if owns_conn:
+                conn.close()
+
+    @staticmethod
+    def get_user_product_count(user_id, search_term='', database_path='inventory.db', conn=None):
+        """Get total number of products for a user, optionally matching a search"""
+        cache_key = (database_path, user_id, 'count', search_term)
+        count = _cache_get(cache_key)
+        if count is not _MISSING:
+            return count
+
+        conn, owns_conn = borrow_connection(database_path, conn)
         try:
-            result = conn.execute('''
+            query = '''
                 SELECT COUNT(*) as count
                 FROM products
                 WHERE user_id = ?
-            ''', (user_id,)).fetchone()
+            '''
+            params = [user_id]
+
+            if search_term:
+                query += ' AND (name LIKE ? OR description LIKE ?)'
+                search_pattern = f'%{search_term}%'
+                params.extend([search_pattern, search_pattern])
 
-            return result['count']
+            count = conn.execute(query, params).fetchone()['count']
+            _cache_set(cache_key, count)
+            return count
 
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
 
     def __repr__(self):
         return f'<Product {self.name}>'
\ No newline at end of file
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash
 from models.user import User
@@ -24,6 +24,8 @@ def validate_password(password):
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """User login"""
+    db_path = current_app.config['DATABASE_PATH']
+
     if current_user.is_authenticated:
         return redirect(url_for('inventory.dashboard'))
 
@@ -43,7 +45,7 @@ def login():
 
         # Try to find user
         try:
-            user = User.get_by_email(email)
+            user = User.get_by_email(email, db_path)
 
             if user and user.check_password(password):
                 login_user(user, remember=remember)
@@ -57,15 +59,17 @@ def login():
             else:
                 flash('Invalid email or password.', 'error')
 
-        except Exception as e:
+        except Exception:
             flash('An error occurred during login. Please try again.', 'error')
-            print(f"Login error: {e}")
+            current_app.logger.exception("Login error")
 
     return render_template('auth/login.html')
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
+    db_path = current_app.config['DATABASE_PATH']
+
     if current_user.is_authenticated:
         return redirect(url_for('inventory.dashboard'))
 
@@ -94,12 +98,12 @@ def register():
 
         # Check if user already exists
         try:
-            if User.email_exists(email):
+            if User.email_exists(email, db_path):
                 flash('An account with this email already exists.', 'error')
                 return render_template('auth/register.html', email=email)
 
             # Create new user
-            user = User.create_user(email, password)
+            user = User.create_user(email, password, db_path)
 
             if user:
                 login_user(user)
@@ -108,9 +112,9 @@ def register():
             else:
                 flash('Failed to create account. Please try again.', 'error')
 
-        except Exception as e:
+        except Exception:
             flash('An error occurred during registration. Please try again.', 'error')
-            print(f"Registration error: {e}")
+            current_app.logger.exception("Registration error")
 
     return render_template('auth/register.html')
 
@@ -127,12 +131,15 @@ def logout():
 @login_required
 def profile():
     """User profile page"""
-    return render_template('auth/profile.html', user=current_user)
+    product_count = current_user.get_product_count(current_app.config['DATABASE_PATH'])
+    return render_template('auth/profile.html', user=current_user, product_count=product_count)
 
 @auth_bp.route('/change-password', methods=['GET', 'POST'])
 @login_required
 def change_password():
     """Change user password"""
+    db_path = current_app.config['DATABASE_PATH']
+
     if request.method == 'POST':
         current_password = request.form.get('current_password', '')
         new_password = request.form.get('new_password', '')
@@ -161,12 +168,12 @@ def change_password():
             return render_template('auth/change_password.html')
 
         try:
-            current_user.update_password(new_password)
+            current_user.update_password(new_password, db_path)
             flash('Password changed successfully!', 'success')
             return redirect(url_for('auth.profile'))
 
-        except Exception as e:
+        except Exception:
             flash('Failed to change password. Please try again.', 'error')
-            print(f"Password change error: {e}")
+            current_app.logger.exception("Password change error")
 
     return render_template('auth/change_password.html')
\ No newline at end of file
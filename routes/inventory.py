@@ -1,22 +1,70 @@
 import os
-import uuid
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_from_directory
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from secrets import token_hex
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_from_directory, abort, g
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from PIL import Image
+from werkzeug.security import safe_join
+from PIL import ExifTags, Image, ImageOps
 from models.product import Product
+from database import get_db_connection
 
 inventory_bp = Blueprint('inventory', __name__)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Copy uploads to disk in 1MB chunks
+SEARCH_MIN_LENGTH = 3  # Shorter search() queries return no results
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')  # Decoders tried for uploads (matches ALLOWED_EXTENSIONS)
+
+# Filled from app config when the blueprint is registered
+_allowed_extensions = frozenset()
+
+@inventory_bp.record_once
+def cache_upload_settings(state):
+    """Snapshot upload settings that are checked once per uploaded file"""
+    global _allowed_extensions
+    _allowed_extensions = frozenset(state.app.config['ALLOWED_EXTENSIONS'])
+
+@inventory_bp.record_once
+def register_db_teardown(state):
+    """Close the request's shared connection when the app context ends"""
+    state.app.teardown_appcontext(close_db)
+
+def get_db():
+    """Return a database connection shared by all model calls in this request"""
+    if 'db' not in g:
+        g.db = get_db_connection(current_app.config['DATABASE_PATH'])
+    return g.db
+
+def close_db(exception=None):
+    """Close the request's shared connection, if one was opened"""
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+_INT_RE = re.compile(r'[+-]?\d+')
+_FLOAT_RE = re.compile(r'[+-]?(?:\d+(?:\.\d*)?|\.\d+)')
+
+def safe_float(value):
+    """Parse a form number, returning None for blank or invalid input"""
+    value = value.strip() if value else ''
+    return float(value) if _FLOAT_RE.fullmatch(value) else None
+
+def safe_int(value):
+    """Parse a form integer, returning 0 for blank or invalid input"""
+    value = str(value).strip() if value else ''
+    return int(value) if _INT_RE.fullmatch(value) else 0
+
 def allowed_file(filename):
     """Check if file type is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in _allowed_extensions
 
 def generate_unique_filename(filename):
     """Generate unique filename to prevent conflicts"""
-    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'jpg'
-    return f"{uuid.uuid4().hex}.{ext}"
+    _, dot, ext = filename.rpartition('.')
+    return f"{token_hex(16)}.{ext.lower() if dot else 'jpg'}"
 
 def create_user_upload_dir(user_id):
     """Create user-specific upload directory"""
@@ -24,79 +72,163 @@ def create_user_upload_dir(user_id):
     os.makedirs(user_dir, exist_ok=True)
     return user_dir
 
-def resize_image(image_path, max_width=1200, max_height=1200, quality=85):
-    """Resize and optimize image"""
+def save_original(source, output_path):
+    """Write an image path or upload stream to output_path unchanged"""
+    if isinstance(source, str):
+        if source != output_path:
+            shutil.copyfile(source, output_path)
+        return
+
+    source.seek(0)
+    with open(output_path, 'wb', buffering=0) as fp:
+        shutil.copyfileobj(source, fp, UPLOAD_CHUNK_SIZE)
+
+def resize_image(source, output_path, max_width=1200, max_height=1200, quality=85):
+    """Resize and optimize an image (path or file object) into output_path"""
     try:
-        with Image.open(image_path) as img:
+        with Image.open(source, formats=IMAGE_FORMATS) as img:
+            # Image.open only reads the header, so small JPEGs without EXIF (GPS,
+            # Orientation, ...) are kept as uploaded; anything else is re-encoded
+            exif = img.getexif()
+            if not exif and img.format == 'JPEG' and img.width <= max_width and img.height <= max_height:
+                save_original(source, output_path)
+                return True
+
             # Convert to RGB if necessary
             if img.mode in ('RGBA', 'P'):
                 img = img.convert('RGB')
 
-            # Calculate new size maintaining aspect ratio
-            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+            # Calculate new size maintaining aspect ratio (orientations 5-8 swap width and height)
+            if exif.get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+                img.thumbnail((max_height, max_width), Image.Resampling.LANCZOS)
+            else:
+                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+            # Apply the EXIF orientation to the pixels, since the saved file carries no metadata
+            img = ImageOps.exif_transpose(img)
 
             # Save optimized image
-            img.save(image_path, 'JPEG', quality=quality, optimize=True)
+            img.save(output_path, 'JPEG', quality=quality, optimize=True, progressive=True)
             return True
-    except Exception as e:
-        print(f"Error resizing image: {e}")
+    except Exception:
+        current_app.logger.exception("Error resizing image")
+        # Don't leave a partially written file behind
+        if os.path.exists(output_path):
+            os.remove(output_path)
         return False
 
-@inventory_bp.route('/dashboard')
-@login_required
-def dashboard():
-    """Main inventory dashboard"""
-    try:
-        search_term = request.args.get('search', '').strip()
-        page = int(request.args.get('page', 1))
-        per_page = 12  # Products per page
-
-        offset = (page - 1) * per_page
+def process_upload(source, output_path):
+    """Resize an upload into output_path and write its listing thumbnail alongside"""
+    if not resize_image(source, output_path):
+        return False
 
-        # Get products for current user
+    # Without a thumbnail, uploaded_file falls back to the full image
+    thumb_width, thumb_height = current_app.config['THUMBNAIL_SIZE']
+    upload_dir, filename = os.path.split(output_path)
+    resize_image(output_path, os.path.join(upload_dir, Product.thumbnail_filename(filename)),
+                 max_width=thumb_width, max_height=thumb_height)
+    return True
+
+def process_uploads(jobs):
+    """Process several (source, output_path) pairs in parallel, returning a success flag per pair"""
+    if len(jobs) <= 1:
+        return [process_upload(source, output_path) for source, output_path in jobs]
+
+    # Pillow releases the GIL while resampling and encoding, so threads overlap well
+    app = current_app._get_current_object()
+
+    def process_in_app_context(job):
+        with app.app_context():
+            return process_upload(*job)
+
+    with ThreadPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+        return list(executor.map(process_in_app_context, jobs))
+
+def get_dashboard_page():
+    """Load one dashboard page of the current user's products from the request args"""
+    db_path = current_app.config['DATABASE_PATH']
+
+    search_term = request.args.get('search', '').strip()
+    page = int(request.args.get('page', 1))
+    after_id = request.args.get('after_id', type=int)
+    per_page = 12  # Products per page
+
+    offset = (page - 1) * per_page
+    conn = get_db()
+
+    # Get products for current user ("Next" links continue after the last product shown)
+    products = Product.get_by_user(
+        user_id=current_user.id,
+        limit=per_page,
+        offset=offset,
+        search_term=search_term,
+        after_id=after_id,
+        database_path=db_path,
+        conn=conn
+    )
+
+    # Fall back to the page number if the anchor product was deleted
+    if after_id and not products and page > 1:
         products = Product.get_by_user(
             user_id=current_user.id,
             limit=per_page,
             offset=offset,
             search_term=search_term,
-            database_path=current_app.config['DATABASE_PATH']
+            database_path=db_path,
+            conn=conn
         )
 
-        # Get total count for pagination
-        total_products = Product.get_user_product_count(
-            user_id=current_user.id,
-            database_path=current_app.config['DATABASE_PATH']
-        )
+    # Get total count for pagination
+    total_products = Product.get_user_product_count(
+        user_id=current_user.id,
+        search_term=search_term,
+        database_path=db_path,
+        conn=conn
+    )
 
-        # Calculate pagination info
-        total_pages = (total_products + per_page - 1) // per_page
-        has_prev = page > 1
-        has_next = page < total_pages
+    # Calculate pagination info
+    total_pages = (total_products + per_page - 1) // per_page
 
+    return {
         # Enhance products with full data
-        enhanced_products = []
-        for product in products:
-            product_dict = product.to_dict(database_path=current_app.config['DATABASE_PATH'])
-            enhanced_products.append(product_dict)
-
-        return render_template('inventory/dashboard.html',
-                             products=enhanced_products,
-                             search_term=search_term,
-                             current_page=page,
-                             total_pages=total_pages,
-                             has_prev=has_prev,
-                             has_next=has_next,
-                             total_products=total_products)
-
-    except Exception as e:
+        'products': Product.to_dict_batch(products, db_path, conn=conn),
+        'search_term': search_term,
+        'current_page': page,
+        'total_pages': total_pages,
+        'has_prev': page > 1,
+        'has_next': page < total_pages,
+        'total_products': total_products
+    }
+
+@inventory_bp.route('/dashboard')
+@login_required
+def dashboard():
+    """Main inventory dashboard"""
+    try:
+        return render_template('inventory/dashboard.html', **get_dashboard_page())
+
+    except Exception:
         flash('Error loading dashboard. Please try again.', 'error')
-        print(f"Dashboard error: {e}")
+        current_app.logger.exception("Dashboard error")
         return render_template('inventory/dashboard.html', products=[])
 
+@inventory_bp.route('/api/dashboard')
+@login_required
+def dashboard_api():
+    """Dashboard page data as JSON (same query args as the dashboard)"""
+    try:
+        return jsonify(get_dashboard_page())
+
+    except Exception:
+        current_app.logger.exception("Dashboard API error")
+        return jsonify({'error': 'Failed to load products'}), 500
+
 @inventory_bp.route('/product/new', methods=['GET', 'POST'])
 @login_required
 def new_product():
     """Create new product"""
+    db_path = current_app.config['DATABASE_PATH']
+
     if request.method == 'POST':
         try:
             # Get form data
@@ -113,22 +245,11 @@ def new_product():
                 return render_template('inventory/product_form.html')
 
             # Convert values
-            def safe_float(value):
-                try:
-                    return float(value) if value and value.strip() else None
-                except:
-                    return None
-
-            def safe_int(value):
-                try:
-                    return int(value) if value and str(value).strip() else 0
-                except:
-                    return 0
-
             quantity = safe_int(quantity)
             buying_price = safe_float(buying_price)
             selling_price = safe_float(selling_price)
             mrp = safe_float(mrp)
+            conn = get_db()
 
             # Create product
             product = Product.create_product(
@@ -136,7 +257,8 @@ def new_product():
                 name=name,
                 description=description,
                 quantity=quantity,
-                database_path=current_app.config['DATABASE_PATH']
+                database_path=db_path,
+                conn=conn
             )
 
             # Set pricing if provided
@@ -145,42 +267,42 @@ def new_product():
                     buying_price=buying_price,
                     selling_price=selling_price,
                     mrp=mrp,
-                    database_path=current_app.config['DATABASE_PATH']
+                    database_path=db_path,
+                    conn=conn
                 )
 
             # Handle file uploads
             uploaded_files = request.files.getlist('images')
             if uploaded_files and uploaded_files[0].filename:
                 user_dir = create_user_upload_dir(current_user.id)
+                accepted_files = []
+                new_images = []
 
                 for file in uploaded_files:
                     if file and allowed_file(file.filename):
                         # Generate unique filename
                         unique_filename = generate_unique_filename(file.filename)
-                        file_path = os.path.join(user_dir, unique_filename)
-
-                        # Save file
-                        file.save(file_path)
-
-                        # Resize and optimize
-                        if resize_image(file_path):
-                            # Add to database
-                            product.add_image(
-                                filename=unique_filename,
-                                original_name=secure_filename(file.filename),
-                                database_path=current_app.config['DATABASE_PATH']
-                            )
-                        else:
-                            # Remove file if resize failed
-                            os.remove(file_path)
-                            flash(f'Failed to process image: {file.filename}', 'warning')
+                        accepted_files.append((file, unique_filename))
+
+                # Resize and optimize straight from the upload streams, writing each file once
+                resized = process_uploads([(file.stream, os.path.join(user_dir, unique_filename))
+                                           for file, unique_filename in accepted_files])
+                for (file, unique_filename), ok in zip(accepted_files, resized):
+                    if ok:
+                        new_images.append((unique_filename, secure_filename(file.filename)))
+                    else:
+                        flash(f'Failed to process image: {file.filename}', 'warning')
+
+                # Add to database
+                if new_images:
+                    product.add_images(new_images, database_path=db_path, conn=conn)
 
             flash(f'Product "{name}" created successfully!', 'success')
             return redirect(url_for('inventory.view_product', product_id=product.id))
 
-        except Exception as e:
+        except Exception:
             flash('Error creating product. Please try again.', 'error')
-            print(f"Product creation error: {e}")
+            current_app.logger.exception("Product creation error")
 
     return render_template('inventory/product_form.html')
 
@@ -188,27 +310,32 @@ def new_product():
 @login_required
 def view_product(product_id):
     """View single product"""
+    db_path = current_app.config['DATABASE_PATH']
+
     try:
-        product = Product.get_by_id(product_id, current_app.config['DATABASE_PATH'])
+        conn = get_db()
+        product_dict = Product.get_full(product_id, db_path, conn=conn)
 
-        if not product or product.user_id != current_user.id:
+        if not product_dict or product_dict['user_id'] != current_user.id:
             flash('Product not found.', 'error')
             return redirect(url_for('inventory.dashboard'))
 
-        product_dict = product.to_dict(database_path=current_app.config['DATABASE_PATH'])
         return render_template('inventory/product_detail.html', product=product_dict)
 
-    except Exception as e:
+    except Exception:
         flash('Error loading product. Please try again.', 'error')
-        print(f"Product view error: {e}")
+        current_app.logger.exception("Product view error")
         return redirect(url_for('inventory.dashboard'))
 
 @inventory_bp.route('/product/<int:product_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_product(product_id):
     """Edit existing product"""
+    db_path = current_app.config['DATABASE_PATH']
+
     try:
-        product = Product.get_by_id(product_id, current_app.config['DATABASE_PATH'])
+        conn = get_db()
+        product = Product.get_by_id(product_id, db_path, conn=conn)
 
         if not product or product.user_id != current_user.id:
             flash('Product not found.', 'error')
@@ -227,54 +354,46 @@ def edit_product(product_id):
             if not name:
                 flash('Product name is required.', 'error')
                 return render_template('inventory/product_form.html',
-                                     product=product.to_dict(database_path=current_app.config['DATABASE_PATH']),
+                                     product=product.to_dict(database_path=db_path, conn=conn),
                                      edit_mode=True)
 
             # Convert values
-            def safe_float(value):
-                try:
-                    return float(value) if value and value.strip() else None
-                except:
-                    return None
-
-            def safe_int(value):
-                try:
-                    return int(value) if value and str(value).strip() else 0
-                except:
-                    return 0
-
             quantity = safe_int(quantity)
             buying_price = safe_float(buying_price)
             selling_price = safe_float(selling_price)
             mrp = safe_float(mrp)
 
             # Update product
-            product.update(name=name, description=description, quantity=quantity, database_path=current_app.config['DATABASE_PATH'])
+            product.update(name=name, description=description, quantity=quantity, database_path=db_path, conn=conn)
 
             product.set_pricing(
                 buying_price=buying_price,
                 selling_price=selling_price,
                 mrp=mrp,
-                database_path=current_app.config['DATABASE_PATH']
+                database_path=db_path,
+                conn=conn
             )
 
             flash(f'Product "{name}" updated successfully!', 'success')
             return redirect(url_for('inventory.view_product', product_id=product.id))
 
-        product_dict = product.to_dict(database_path=current_app.config['DATABASE_PATH'])
+        product_dict = product.to_dict(database_path=db_path, conn=conn)
         return render_template('inventory/product_form.html', product=product_dict, edit_mode=True)
 
-    except Exception as e:
+    except Exception:
         flash('Error editing product. Please try again.', 'error')
-        print(f"Product edit error: {e}")
+        current_app.logger.exception("Product edit error")
         return redirect(url_for('inventory.dashboard'))
 
 @inventory_bp.route('/product/<int:product_id>/delete', methods=['POST'])
 @login_required
 def delete_product(product_id):
     """Delete product"""
+    db_path = current_app.config['DATABASE_PATH']
+
     try:
-        product = Product.get_by_id(product_id, current_app.config['DATABASE_PATH'])
+        conn = get_db()
+        product = Product.get_by_id(product_id, db_path, conn=conn)
 
         if not product or product.user_id != current_user.id:
             flash('Product not found.', 'error')
@@ -283,62 +402,93 @@ def delete_product(product_id):
         product_name = product.name
 
         # Delete associated images from filesystem
-        images = product.get_images(current_app.config['DATABASE_PATH'])
+        images = product.get_images(db_path, conn=conn)
         user_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', f'user_{current_user.id}')
 
         for image in images:
-            file_path = os.path.join(user_dir, image['filename'])
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            for filename in (image['filename'], Product.thumbnail_filename(image['filename'])):
+                try:
+                    os.remove(os.path.join(user_dir, filename))
+                except FileNotFoundError:
+                    pass
 
         # Delete product (cascade will handle database cleanup)
-        product.delete(current_app.config['DATABASE_PATH'])
+        product.delete(db_path, conn=conn)
 
         flash(f'Product "{product_name}" deleted successfully.', 'success')
 
-    except Exception as e:
+    except Exception:
         flash('Error deleting product. Please try again.', 'error')
-        print(f"Product deletion error: {e}")
+        current_app.logger.exception("Product deletion error")
 
     return redirect(url_for('inventory.dashboard'))
 
+def accel_redirect(prefix, *path_parts):
+    """Hand an upload off to nginx via X-Accel-Redirect"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    file_path = safe_join(upload_folder, *path_parts)
+    if file_path is None or not os.path.isfile(file_path):
+        abort(404)
+
+    relative_path = os.path.relpath(file_path, upload_folder).replace(os.sep, '/')
+    response = current_app.response_class()
+    response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{relative_path}"
+    # Let nginx pick the content type from the file extension
+    del response.headers['Content-Type']
+    response.cache_control.max_age = current_app.config['UPLOAD_CACHE_MAX_AGE']
+    return response
+
 @inventory_bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    """Serve uploaded files"""
+    """Serve uploaded files (?size=thumb serves the listing thumbnail when one exists)"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    max_age = current_app.config['UPLOAD_CACHE_MAX_AGE']
+    accel_prefix = current_app.config['X_ACCEL_REDIRECT_PREFIX']
+
     # Extract user directory from filename path
     if '/' in filename:
         user_folder, file_name = filename.split('/', 1)
-        user_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', user_folder)
-        return send_from_directory(user_dir, file_name)
+        path_parts = ['products', user_folder, file_name]
+    else:
+        path_parts = [filename]
+
+    # Images uploaded before thumbnails existed only have the full-size file
+    if request.args.get('size') == 'thumb':
+        thumb_parts = path_parts[:-1] + [Product.thumbnail_filename(path_parts[-1])]
+        thumb_path = safe_join(upload_folder, *thumb_parts)
+        if thumb_path is not None and os.path.isfile(thumb_path):
+            path_parts = thumb_parts
+
+    if accel_prefix:
+        response = accel_redirect(accel_prefix, *path_parts)
     else:
-        return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+        response = send_from_directory(os.path.join(upload_folder, *path_parts[:-1]), path_parts[-1],
+                                       max_age=max_age, conditional=True, etag=True)
+
+    # Upload filenames are random and never reused, so the content can't change
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @inventory_bp.route('/search')
 @login_required
 def search():
     """Search products (AJAX endpoint)"""
+    db_path = current_app.config['DATABASE_PATH']
+
     try:
         query = request.args.get('q', '').strip()
         limit = int(request.args.get('limit', 10))
 
-        if not query:
+        # One- and two-letter queries match almost everything; wait for more input
+        if len(query) < SEARCH_MIN_LENGTH:
             return jsonify({'products': []})
 
-        products = Product.get_by_user(
-            user_id=current_user.id,
-            limit=limit,
-            search_term=query,
-            database_path=current_app.config['DATABASE_PATH']
-        )
-
-        # Convert to dictionary format
-        results = []
-        for product in products:
-            product_dict = product.to_dict(database_path=current_app.config['DATABASE_PATH'])
-            results.append(product_dict)
+        # Pass get_db uncalled so cached results don't open a connection
+        results = Product.search(current_user.id, query, limit, database_path=db_path, conn=get_db)
 
         return jsonify({'products': results})
 
-    except Exception as e:
-        print(f"Search error: {e}")
+    except Exception:
+        current_app.logger.exception("Search error")
         return jsonify({'error': 'Search failed'}), 500
\ No newline at end of file